@@ -9,17 +9,21 @@ from src.interpreter import Interpreter, AttoMissingMainError, AttoRuntimeError
 from src.lexer import AttoSyntaxError
 
 
-def run_interpreter(script: Path):
+def run_interpreter(script: Path, specialize: bool = False, memoize: bool = False):
     """Runs the interpreter
 
     Parameters
     ----------
     script : Path
         The path to the script file we want to execute
+    specialize : bool, Optional(False)
+        Run the script as generated python code instead
+    memoize : bool, Optional(False)
+        Remember results of functions that does no input or output
     """
 
     try:
-        interpreter = Interpreter()
+        interpreter = Interpreter(specialize=specialize, memoize=memoize)
         interpreter.exec_file(script)
     except (AttoSyntaxError, AttoMissingMainError, AttoRuntimeError) as e:
         print(f"{e}")
@@ -31,12 +35,22 @@ def main():
     """Main function of our interpreter program"""
     arg_parser = ArgumentParser()
     arg_parser.add_argument("file", help="The atto-script to run")
+    arg_parser.add_argument(
+        "--specialize",
+        action="store_true",
+        help="Run the script as generated python code, faster but without atto tracebacks",
+    )
+    arg_parser.add_argument(
+        "--memoize",
+        action="store_true",
+        help="Remember results of functions that does no input or output",
+    )
     args = arg_parser.parse_args()
 
     # handle other argv options in the future
 
     script = Path(__file__).parent.absolute() / args.file
-    run_interpreter(script)
+    run_interpreter(script, args.specialize, args.memoize)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,325 @@
+"""This module compiles the parsed AST into a flat list of instructions.
+
+Each function body is walked once and turned into a list of instructions that
+the Interpreter executes in a simple loop, instead of walking the tree on every
+evaluation.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Set, Tuple
+import operator
+
+from src.parser import ASTnode, Func
+from src.lexer import Token, TokenTypes, AttoSyntaxError
+
+# The opcodes our virtual machine understands
+OP_CONST = 1  # push arg onto the stack
+OP_LOAD_ARG = 2  # push the arg in slot arg of the current call onto the stack
+OP_JUMP = 3  # continue execution at arg
+OP_JUMP_IF_FALSE = 4  # pop a value, continue execution at arg if it is falsy
+OP_CALL = 5  # arg is (func, n_args), pops n_args and pushes the result
+OP_TAIL_CALL = 6  # as OP_CALL, but its result is the result of the function
+OP_ADD = 10
+OP_NEG = 11
+OP_MUL = 12
+OP_DIV = 13
+OP_INV = 14
+OP_REM = 15
+OP_EQ = 20
+OP_LESS = 21
+OP_HEAD = 30
+OP_TAIL = 31
+OP_PAIR = 32
+OP_FUSE = 33
+OP_LITR = 40
+OP_STR = 41
+OP_WORDS = 42
+OP_IN = 50  # arg is True if a prompt should be popped from the stack
+OP_OUT = 51
+
+# One instruction: (opcode, argument, token that generated it)
+Instr = Tuple[int, Any, Token | None]
+
+# The calls an inlined instruction came from, outermost call first,
+# each one as (token that called the function, the called function)
+InlineChain = List[Tuple[Token, Func]]
+
+# Max number of instructions in a function body that is inlined
+INLINE_SIZE = 8
+
+# Operators that are computed while compiling when all operands are constants
+# of the same type, opcode -> (allowed operand types, the operation).
+# Lists are mutable and never constants, so PAIR and FUSE are never folded.
+_FOLD: Dict[int, Tuple[tuple, Callable]] = {
+    OP_ADD: ((float, str), operator.add),
+    OP_NEG: ((float,), operator.neg),
+    OP_MUL: ((float,), operator.mul),
+    OP_DIV: ((float,), operator.truediv),
+    OP_INV: ((float,), lambda vlu: 1 / vlu),
+    OP_REM: ((float,), operator.mod),
+    OP_EQ: ((type(None), bool, float, str), operator.eq),
+    OP_LESS: ((float, str), operator.lt),
+    OP_LITR: ((float, str), float),
+    OP_STR: ((type(None), bool, float, str), str),
+}
+
+
+class Compiler:
+    """Compiles function bodies into a flat list of instructions.
+
+    The instructions are made for a stack machine. Each expression pushes its
+    value onto the stack, operators pop their operands and push their result.
+    An if expression is turned into conditional jumps.
+
+    The Parser has already resolved identifiers into an index into the frame
+    arguments and calls into a direct reference to the called Func, they are
+    stored in the instructions so that no lookups has to be done while
+    executing.
+
+    Calls to small functions are inlined, the body of the called function is
+    copied into the caller instead of a call instruction. This is only done
+    when it doesn't change what the program does, see _inline.
+
+    Operators with only constant operands are computed while compiling and
+    replaced by their result, an if with a constant condition is replaced by
+    the branch it takes.
+    """
+
+    def __init__(self):
+        self._func: Func
+        self._code: List[Instr]
+        self._inlined: Dict[int, InlineChain]
+        # index of the last jump target, code before it can't be folded
+        self._label = 0
+        self._compiling: Set[Func] = set()
+
+    def compile(self, func: Func) -> List[Instr]:
+        """Compile the body of func and store the result as func._code
+
+        Functions it calls that are not yet compiled are compiled first,
+        so that they can be inlined.
+
+        Parameters
+        ----------
+        func : Func
+            The function to compile
+
+        Returns
+        -------
+        List[Instr] : The instructions for the function body
+
+        """
+
+        # save the state of the function we were compiling, if any
+        outer = self.__dict__.copy()
+        self._compiling.add(func)
+        self._func = func
+        self._code = []
+        self._inlined = {}
+        self._label = 0
+        if func.body is None:
+            self._code.append((OP_CONST, None, func.name_tok))
+        else:
+            self._emit(func.body)
+        self._mark_tail_calls()
+
+        code = func._code = self._code
+        func._inlined = self._inlined
+        self._compiling.discard(func)
+        self.__dict__.update(outer)
+        return code
+
+    def _emit(self, node: ASTnode) -> None:
+        assert node.token is not None
+        tok = node.token
+        code = self._code
+
+        match tok.type:
+            case TokenTypes.IDENT:
+                code.append((OP_LOAD_ARG, node.arg_slot, tok))
+
+            case (
+                TokenTypes.NUMBER
+                | TokenTypes.STRING
+                | TokenTypes.TRUE
+                | TokenTypes.FALSE
+                | TokenTypes.NULL
+            ):
+                code.append((OP_CONST, tok.value(), tok))
+
+            case TokenTypes.IF:
+                # The parser ensures all 3 branches are populated.
+                self._emit(node.left)  # type: ignore [arg-type]
+                if self._constants(1):
+                    # the condition is known, only emit the branch taken
+                    cond = code[-1][1]
+                    self._drop(len(code) - 1)
+                    self._emit(node.right.left if cond else node.right.right)  # type: ignore [union-attr, arg-type]
+                    return
+
+                jump_false = len(code)
+                code.append((OP_JUMP_IF_FALSE, None, tok))
+                self._emit(node.right.left)  # type: ignore [union-attr, arg-type]
+                jump_end = len(code)
+                code.append((OP_JUMP, None, tok))
+                code[jump_false] = (OP_JUMP_IF_FALSE, len(code), tok)
+                self._label = len(code)
+                self._emit(node.right.right)  # type: ignore [union-attr, arg-type]
+                code[jump_end] = (OP_JUMP, len(code), tok)
+                self._label = len(code)
+
+            case TokenTypes.ADD:
+                self._emit_op(OP_ADD, node, 2)
+            case TokenTypes.NEG:
+                self._emit_op(OP_NEG, node, 1)
+            case TokenTypes.MUL:
+                self._emit_op(OP_MUL, node, 2)
+            case TokenTypes.DIV:
+                self._emit_op(OP_DIV, node, 2)
+            case TokenTypes.INV:
+                self._emit_op(OP_INV, node, 1)
+            case TokenTypes.REM:
+                self._emit_op(OP_REM, node, 2)
+            case TokenTypes.EQ:
+                self._emit_op(OP_EQ, node, 2)
+            case TokenTypes.LESS:
+                self._emit_op(OP_LESS, node, 2)
+            case TokenTypes.HEAD:
+                self._emit_op(OP_HEAD, node, 1)
+            case TokenTypes.TAIL:
+                self._emit_op(OP_TAIL, node, 1)
+            case TokenTypes.PAIR:
+                self._emit_op(OP_PAIR, node, 2)
+            case TokenTypes.FUSE:
+                self._emit_op(OP_FUSE, node, 2)
+            case TokenTypes.LITR:
+                self._emit_op(OP_LITR, node, 1)
+            case TokenTypes.STR:
+                self._emit_op(OP_STR, node, 1)
+            case TokenTypes.WORDS:
+                self._emit_op(OP_WORDS, node, 1)
+            case TokenTypes.OUT:
+                self._emit_op(OP_OUT, node, 1)
+
+            case TokenTypes.IN:
+                if node.left:
+                    self._emit(node.left)
+                code.append((OP_IN, node.left is not None, tok))
+
+            case TokenTypes.CALL:
+                for arg in node.arg_nodes:
+                    if arg is None:
+                        raise AttoSyntaxError(f"Missing argument for {tok.text()} at", tok)
+                    self._emit(arg)
+                func = node.call_target
+                assert func is not None
+                if func._code is None and func not in self._compiling:
+                    self.compile(func)
+                if not self._inline(func, tok):
+                    code.append((OP_CALL, (func, len(node.arg_nodes)), tok))
+
+            case _:
+                raise AttoSyntaxError(f"Unhandled token type {tok.type} at", tok)
+
+    def _inline(self, func: Func, tok: Token) -> bool:
+        # The args are already pushed onto the stack in order. If the body
+        # starts by loading each of its args once, in order, and never loads
+        # them again, the rest of its body can run on the stack as it is.
+        # Functions that call other functions are not inlined, so that a
+        # traceback can be rebuilt from the InlineChain, see Interpreter._run.
+        # A body shorter than its args, as in "fn first x y is x", or one with
+        # a duplicate param, as in "fn a x x is x", doesn't load every arg and
+        # would leave the rest on the stack.
+        callee = func._code
+        n_args = len(func.parm)
+        if callee is None or len(callee) < n_args or len(callee) - n_args > INLINE_SIZE:
+            return False
+        for pc, (op, arg, _) in enumerate(callee):
+            if op == OP_CALL or op == OP_TAIL_CALL:
+                return False
+            elif pc < n_args and (op != OP_LOAD_ARG or arg != pc):
+                return False
+            elif pc >= n_args and op == OP_LOAD_ARG:
+                return False
+
+        # jumps in the callee are relative to its own start, code with jumps
+        # is copied as it is, as folding would move the jump targets
+        offset = len(self._code) - n_args
+        has_jumps = any(op == OP_JUMP or op == OP_JUMP_IF_FALSE for op, _, _ in callee)
+        for pc in range(n_args, len(callee)):
+            op, arg, instr_tok = callee[pc]
+            if has_jumps:
+                if op == OP_JUMP or op == OP_JUMP_IF_FALSE:
+                    arg += offset
+                self._code.append((op, arg, instr_tok))
+            elif self._append((op, arg, instr_tok)):
+                continue  # folded into a constant
+            self._inlined[len(self._code) - 1] = [(tok, func)] + func._inlined.get(pc, [])
+
+        if has_jumps:
+            self._label = len(self._code)
+        return True
+
+    def _mark_tail_calls(self) -> None:
+        # A call is a tail call when nothing but jumps follows it before the
+        # end of the function, its result is then the result of the function.
+        code = self._code
+        for pc, (op, arg, tok) in enumerate(code):
+            if op != OP_CALL:
+                continue
+            nxt = pc + 1
+            while nxt < len(code) and code[nxt][0] == OP_JUMP:
+                nxt = code[nxt][1]
+            if nxt == len(code):
+                code[pc] = (OP_TAIL_CALL, arg, tok)
+
+    def _emit_op(self, op: int, node: ASTnode, n_operands: int) -> None:
+        # the operand tokens are kept as arg to point out bad operands on error
+        tok = node.token
+        assert tok is not None
+        left, right = node.left, node.right
+        if left is None or (n_operands == 2 and right is None):
+            raise AttoSyntaxError(f"Missing operand for {tok.text()} at", tok)
+        self._emit(left)
+        operands: Tuple[Token | None, ...] = (left.token,)
+        if right is not None:
+            self._emit(right)
+            operands += (right.token,)
+        self._append((op, operands, tok))
+
+    def _append(self, instr: Instr) -> bool:
+        # Append instr to the code, or if it is an operator and all its
+        # operands are constants, replace them with the result.
+        # Returns True when folded.
+        op, operands, tok = instr
+        fold = _FOLD.get(op)
+        if fold is not None and self._constants(len(operands)):
+            types, operation = fold
+            start = len(self._code) - len(operands)
+            vlus = [vlu for _, vlu, _ in self._code[start:]]
+            if type(vlus[0]) in types and all(type(v) is type(vlus[0]) for v in vlus):
+                try:
+                    vlu = operation(*vlus)
+                except (ArithmeticError, ValueError):
+                    pass  # let it fail when executed, with a traceback
+                else:
+                    self._drop(start)
+                    self._code.append((OP_CONST, vlu, tok))
+                    return True
+
+        self._code.append(instr)
+        return False
+
+    def _constants(self, n: int) -> bool:
+        # whether the last n instructions each pushes a constant,
+        # a jump target in between means they belong to different expressions
+        start = len(self._code) - n
+        return start >= self._label and all(
+            op == OP_CONST for op, _, _ in self._code[start:]
+        )
+
+    def _drop(self, start: int) -> None:
+        # remove the instructions from start onwards
+        for pc in range(start, len(self._code)):
+            self._inlined.pop(pc, None)
+        del self._code[start:]
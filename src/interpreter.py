@@ -1,13 +1,42 @@
 """This module executes the actual atto code."""
 
 from __future__ import annotations
-from typing import Dict, List, Union, cast
+from typing import Callable, Dict, List, NoReturn, Tuple, Union, cast
 from pathlib import Path
-from copy import deepcopy
+from types import CodeType
+from math import copysign
 from sys import setrecursionlimit
 
-from src.parser import Parser, ASTnode, Func
-from src.lexer import Token, TokenTypes, AttoSyntaxError
+from src.parser import Parser, Func
+from src.lexer import Token
+from src.specializer import Specializer, namespace as specializer_namespace
+from src.compiler import (
+    Compiler,
+    Instr,
+    OP_CONST,
+    OP_LOAD_ARG,
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_CALL,
+    OP_TAIL_CALL,
+    OP_ADD,
+    OP_NEG,
+    OP_MUL,
+    OP_DIV,
+    OP_INV,
+    OP_REM,
+    OP_EQ,
+    OP_LESS,
+    OP_HEAD,
+    OP_TAIL,
+    OP_PAIR,
+    OP_FUSE,
+    OP_LITR,
+    OP_STR,
+    OP_WORDS,
+    OP_IN,
+    OP_OUT,
+)
 
 # Path to src folder
 SRC_PATH = Path(__file__).absolute().parent
@@ -15,13 +44,32 @@ SRC_PATH = Path(__file__).absolute().parent
 # Path to core lib file
 CORE_LIB_PATH = SRC_PATH.parent / "corelib" / "core.at"
 
-# Allow for complex factorials to not smash recursion limit
+# The virtual machine does not recurse in python, but specialized code
+# recurses in python for each atto call, allow for complex factorials
+# to not smash the recursion limit
 setrecursionlimit(10**6)
 
+# max number of results kept when memoizing pure functions
+MEMO_SIZE = 100_000
+
 # possible value types
 Value = Union[None | bool | float | str | List[None | bool | float | str]]
 
 
+# opcode -> handler method of the Interpreter, registered with @op
+_HANDLERS: Dict[int, Callable] = {}
+
+
+def op(opcode: int):
+    """Decorator that registers a method as the handler for opcode"""
+
+    def register(method: Callable) -> Callable:
+        _HANDLERS[opcode] = method
+        return method
+
+    return register
+
+
 class AttoMissingMainError(RuntimeError):
     """When main function is missing."""
 
@@ -85,11 +133,14 @@ class Frame:
     caller_tok : Token
         The token that called this frame.
     args : List[Value]
-        Arguments for this frame
+        Arguments for this frame, the virtual machine keeps the args of
+        the frames it creates on its value stack instead and leaves this empty
     func : Func
         The Func object, parsed representation of the function to execute
     """
 
+    __slots__ = ("caller_frm", "caller_tok", "args", "func")
+
     def __init__(
         self,
         caller_frm: Frame | None,
@@ -107,7 +158,8 @@ class Interpreter:
     """The interpreter class, executes the parsed source code.
 
     It loads a source file or plain source text, lets the Parser parse it into
-    an AST tree, then walks that tree to execute our program.
+    an AST tree, lets the Compiler flatten that tree into instructions and
+    then executes those instructions to run our program.
 
     By default it loads the atto corelib and mixes that into the function
     signatures of our program. It is possible to exclude corelib, but not
@@ -117,6 +169,10 @@ class Interpreter:
     ----------
     use_corelib : bool
         Whether we use corelib, defaults to True
+    specialize : bool
+        Whether programs are run as specialized python code, defaults to False
+    memoize : bool
+        Whether results of pure functions are memoized, defaults to False
     parser : Parser
         The Parser instance that parsed the AST tree
 
@@ -125,21 +181,43 @@ class Interpreter:
     use_corelib : bool, optional(True)
         Whether we should load corelib, recommend to leave as is if not in
         a unittest mode
+    specialize : bool, optional(False)
+        Run programs as generated python code instead of in our own VM.
+        Faster, but runtime errors can't show a traceback of the atto calls.
+    memoize : bool, optional(False)
+        Remember the results of calls to pure functions, functions that
+        neither does nor calls anything that does input or output, so calling
+        them again with the same args skips the call. Only used by the VM.
     """
 
     _corelib_code: str | None = None
     _corelib_funcs: Dict[str, Func] | None = None
+    # compiled specialized python code, by its source text
+    _specialized_cache: Dict[str, CodeType] = {}
 
-    def __init__(self, use_corelib=True):
+    def __init__(self, use_corelib=True, specialize=False, memoize=False):
         # initialize core lib as a singleton pattern
         if not Interpreter._corelib_code and use_corelib:
-            with open(CORE_LIB_PATH, mode="r") as f:
-                Interpreter._corelib_code = f.read()
+            # read as bytes and decode, skips the newline translation
+            with open(CORE_LIB_PATH, mode="rb") as f:
+                Interpreter._corelib_code = f.read().decode("utf8")
 
             core_parser = Parser(Interpreter._corelib_code, CORE_LIB_PATH)
             Interpreter._corelib_funcs = core_parser.funcs
+            compiler = Compiler()
+            for func in core_parser.funcs.values():
+                compiler.compile(func)
 
         self.use_corelib = use_corelib
+        self.specialize = specialize
+        self.memoize = memoize
+
+        # dispatch table for the virtual machine, indexed by opcode,
+        # calls, jumps, constants and args are handled directly in _run
+        self._handlers: Tuple[Callable | None, ...] = tuple(
+            _HANDLERS[opcode].__get__(self) if opcode in _HANDLERS else None
+            for opcode in range(max(_HANDLERS) + 1)
+        )
 
     def exec_file(self, path: Path) -> int:
         """Loads an atto source file as then executes it.
@@ -166,8 +244,8 @@ class Interpreter:
         """
 
         try:
-            with open(path, mode="r", encoding="utf8") as f:
-                source = f.read()
+            with open(path, mode="rb") as f:
+                source = f.read().decode("utf8")
         except (FileNotFoundError, IOError) as e:
             print(f"Error opening file: {path}: {e}")
             return 1
@@ -195,20 +273,32 @@ class Interpreter:
             When an error occurs during execution.
         """
 
-        funcs = deepcopy(Interpreter._corelib_funcs) if self.use_corelib else {}
+        # The corelib Func objects are never changed after they are parsed and
+        # compiled, so all programs can share them, only the dict is copied.
+        # When the program redefines a corelib function, the Parser replaces
+        # the corelib functions that call it with copies calling the new one.
+        funcs = dict(Interpreter._corelib_funcs) if self.use_corelib else {}  # type: ignore [arg-type]
         if path is None:
             path = Path()
 
         self.parser = Parser(source, path, funcs)
+        # Compiling main also compiles each function it calls. Functions main
+        # can't reach are never compiled, so a broken one doesn't stop the program.
+        main = self.parser.funcs.get("main")
+        if main is not None and main._code is None:
+            Compiler().compile(main)
+
         return self._eval()
 
     def _eval(self) -> int:
         if not "main" in self.parser.funcs:
             raise AttoMissingMainError("Function main is not found in the source.")
 
-        frame = Frame(None, None, [], self.parser.funcs["main"])
-        node = frame.func.body
-        vlu = self._eval_node(node, frame)
+        if self.specialize:
+            vlu = self._specialize(self.parser.funcs["main"])()
+        else:
+            frame = Frame(None, None, [], self.parser.funcs["main"])
+            vlu = self._run(frame.func._code, frame)  # type: ignore [arg-type]
 
         if vlu is None:
             return 0
@@ -222,206 +312,342 @@ class Interpreter:
         else:
             return 0
 
-    def _eval_node(self, node: ASTnode | None, frame: Frame) -> Value:
-        """Evaluates each AST node recursively
+    def _specialize(self, func: Func) -> Callable[..., Value]:
+        """Turn func, and all functions it calls, into python functions.
+
+        The Specializer generates python source for the functions, which is
+        compiled by python and cached by its source text, so that running the
+        same program again only has to generate the source.
+
+        Parameters
+        ----------
+        func : Func
+            The function to specialize, normally main
+
+        Returns
+        -------
+        Callable : A python function that takes the same args as func
+        """
 
-        This is the tree-traversal method for each AST node.
-        A more grown up interpreter would use this step to compile to bytecode
-        instead and let the Interpreter stage come after the compile stage.
-        As atto is as simple as possible we evaluate directly from the AST tree.
+        specializer = Specializer()
+        source = specializer.generate(func)
+        code = Interpreter._specialized_cache.get(source)
+        if code is None:
+            code = compile(source, "<atto>", "exec")
+            Interpreter._specialized_cache[source] = code
+
+        ns = specializer_namespace(specializer.ctx)
+        exec(code, ns)
+        return ns["_f0"]
+
+    def _run(self, code: List[Instr], frame: Frame) -> Value:
+        """Executes the compiled instructions of a function.
+
+        This is the virtual machine of our interpreter. The Compiler has
+        flattened the AST tree of each function body into a list of
+        instructions, here we step through them one at a time with pc as
+        program counter. Each instruction pushes its result onto a value stack
+        and pops its operands from it, when we reach the end of the code the
+        result of the function is the only thing left on the stack.
+
+        All functions share the same value stack. The args of a call are
+        left on the stack where the caller pushed them, base is the index of
+        the first arg of the function currently executing.
+
+        Calls to atto functions do not recurse in python. The state of the
+        caller is saved on an explicit call stack and execution continues in
+        the called function, when it reaches its end its args are removed from
+        the stack, the caller is restored and the result is pushed. This way
+        deep recursion in atto is only limited by memory, not by the python
+        recursion limit.
+
+        A tail call, a call whose result is the result of the function making
+        it, does not save the caller on the call stack. The called function
+        replaces the args of the caller and returns directly to the caller's
+        caller. It also takes over the Frame of the function making the call,
+        only func is changed, so a loop of tail calls runs in constant memory.
+        A traceback therefore shows only the last function of a chain of tail
+        calls, called from where the first one was called.
+
+        When memoizing, the result of a call to a pure function is stored by
+        its args, calling it again with the same args pushes the stored result
+        instead. Lists are never memoized, as they are mutable.
+
+        A Frame is no longer used when its function returns, so it is put in
+        a pool and reused by the next call instead of creating a new one.
+
+        Inlined instructions runs in the frame of the caller, if one of them
+        fails the frames of the inlined calls are added to the error, so that
+        the traceback looks as if the calls were never inlined.
+
+        The most frequent opcodes are handled directly in the loop, every other
+        opcode is looked up in a dispatch table of handler methods.
 
         Parameters
         ----------
-        node : ASTnode
-            The node to evaluate
+        code : List[Instr]
+            The compiled function body to execute
         frame : Frame
             The function frame currently executing.
             When you think of a call stack, each entry in a callstack is a Frame
 
         Returns
         -------
-        Value : The result of current expression
+        Value : The result of the function
         """
 
-        # This function is a bit lengthy, although that is nothing compared to
-        # cpython's internal eval loop which in the past spanned several 1000 lines.
-        # doing this in one function, instead of delegating from a router function
-        # is actually simpler and more efficient (less call overhead and scattering).
-        # Each entry is rather neatly structured due to the match case construct.
-        assert node is not None
-        assert node.token is not None
-
-        match node.token.type:
-            case TokenTypes.IDENT:
-                name = node.token.text()
-                return frame.args[frame.func.params().index(name)]
-
-            case (
-                TokenTypes.NUMBER
-                | TokenTypes.STRING
-                | TokenTypes.TRUE
-                | TokenTypes.FALSE
-                | TokenTypes.NULL
-            ):
-                return node.token.value()
-
-            case TokenTypes.IF:
-                expr = self._eval_node(node.left, frame)
-                if expr:
-                    return self._eval_node(node.right.left, frame)  # type: ignore [union-attr]
-                else:
-                    return self._eval_node(node.right.right, frame)  # type: ignore [union-attr]
-
-            case TokenTypes.ADD:
-                # The parser ensures node left and node right are populated.
-                left = self._eval_node(node.left, frame)  # type: ignore [union-attr]
-                right = self._eval_node(node.right, frame)  # type: ignore [union-attr]
-                self.check_type(left, (float, str), node.left, frame)
-                self.check_type(right, (float, str), node.right, frame)
-                return left + right  # type: ignore [operator]
-
-            case TokenTypes.NEG:
-                vlu = self._eval_node(node.left, frame)
-                self.check_type(vlu, (float,), node, frame)
-                return -vlu  # type: ignore [operator]
-
-            case TokenTypes.MUL:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-                self.check_type(left, (float,), node.right, frame)
-                self.check_type(right, (float,), node.right, frame)
-                return left * right  # type: ignore [operator]
-
-            case TokenTypes.DIV:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-                self.check_type(left, (float,), node.right, frame)
-                self.check_type(right, (float,), node.right, frame)
-                return left / right  # type: ignore [operator]
-
-            case TokenTypes.INV:
-                left = self._eval_node(node.left, frame)
-                self.check_type(left, (float,), node.right, frame)
-                return 1 / left  # type: ignore [operator]
-
-            case TokenTypes.REM:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-                self.check_type(left, (float,), node.right, frame)
-                self.check_type(right, (float,), node.right, frame)
-                return left % right  # type: ignore [operator]
-
-            case TokenTypes.EQ:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-                return left == right
-
-            case TokenTypes.LESS:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-                self.check_type(left, (float, str), node.right, frame)
-                self.check_type(right, (float, str), node.right, frame)
-                return left < right  # type: ignore [operator]
-
-            case TokenTypes.HEAD:
-                left = self._eval_node(node.left, frame)
-                if isinstance(left, (list, str)):
-                    return left[0] if left else None
-                return None
-
-            case TokenTypes.TAIL:
-                left = self._eval_node(node.left, frame)
-                if isinstance(left, (list, str)):
-                    return left[1:] if len(left) > 1 else None
-                return None
-
-            case TokenTypes.PAIR:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-                return cast(Value, [left, right])
-
-            case TokenTypes.FUSE:
-                left = self._eval_node(node.left, frame)
-                right = self._eval_node(node.right, frame)
-
-                if isinstance(left, list):
-                    if isinstance(right, list):
-                        return cast(Value, left + right)
-                    left.append(right)
-                    return cast(Value, left)
-                elif isinstance(right, list):
-                    return cast(Value, [left] + right)
-                return cast(Value, [left, right])
-
-            case TokenTypes.LITR:
-                left = self._eval_node(node.left, frame)
-                if isinstance(left, float):
-                    return left
-                elif isinstance(left, str):
-                    try:
-                        return float(left)
-                    except ValueError:
-                        pass
-                # also catches when left is a list
-                value = node.left.token.value()  # type: ignore [union-attr]
-                raise AttoRuntimeError(
-                    (
-                        f"Failed to convert {value} to number"
-                    ),
-                    node.token,
-                    frame,
-                )
-
-            case TokenTypes.STR:
-                left = self._eval_node(node.left, frame)
-                if isinstance(left, list):
-                    lst = [str(e) for e in left]
-                    return " ".join(lst)
-                return str(left)
-
-            case TokenTypes.WORDS:
-                left = self._eval_node(node.left, frame)
-                if isinstance(left, str):
-                    return cast(Value, left.split())
-
-            case TokenTypes.IN:
-                if node.left:
-                    return input(self._eval_node(node.left, frame))
-                return input()
-
-            case TokenTypes.OUT:
-                left = self._eval_node(node.left, frame)
-                if isinstance(left, bool):
-                    print(str(left).lower())
-                elif left is None:
-                    print("null")
-                else:
-                    print(left)
-                return None
-
-            case TokenTypes.CALL:
-                new_func = self.parser.funcs[node.token.text()]
-                # get the args
-                args = []
-                n: ASTnode = node
-                while n := n.left:  # type: ignore [assignment]
-                    args.append(self._eval_node(n.right, frame))
+        # saved state of the callers, (code, pc, end, base, frame, memo key)
+        calls: List[tuple] = []
+        # frames of returned calls, reused for the next calls
+        pool: List[Frame] = []
+        # results of pure calls by their memo key, only used when memoizing
+        memoize = self.memoize
+        memo: Dict[tuple, Value] = {}
+        stack: List[Value] = list(frame.args)
+        handlers = self._handlers
+        base = 0
+        pc = 0
+        end = len(code)
+        while True:
+            if pc == end:
+                # end of function, return to the caller
+                vlu = stack.pop()
+                if not calls:
+                    return vlu
+                pool.append(frame)
+                del stack[base:]
+                code, pc, end, base, frame, key = calls.pop()
+                stack.append(vlu)
+                if key is not None and type(vlu) is not list:
+                    if len(memo) >= MEMO_SIZE:
+                        del memo[next(iter(memo))]
+                    memo[key] = vlu
+                continue
+
+            op, arg, tok = code[pc]
+            pc += 1
+            # The most frequent opcodes are tested first, in order of how
+            # often they are executed by recursive programs such as fib.
+            if op == OP_LOAD_ARG:
+                stack.append(stack[base + arg])
+            elif op == OP_CALL or op == OP_TAIL_CALL:
+                func, n_args = arg
+                args_base = len(stack) - n_args
 
                 # uncomment to debug interpreter function calls
-                # print("Calling", new_func.name(), "args", args, "from", node.token.line_col())
+                # print("Calling", func.name(), "args", stack[args_base:], "from", tok.line_col())
+
+                key = None
+                if memoize and func.pure:
+                    args = tuple(stack[args_base:])
+                    # types are part of the key as 1 == true in python,
+                    # and the sign of each number as 0.0 == -0.0
+                    types = tuple(map(type, args))
+                    if list not in types:
+                        signs = tuple(
+                            copysign(1.0, a) for a in args if type(a) is float
+                        )
+                        key = (func, args, types, signs)
+                        if key in memo:
+                            del stack[args_base:]
+                            stack.append(memo[key])
+                            continue
+
+                if op == OP_TAIL_CALL and key is None:
+                    # The result of the call is our result, so there is no
+                    # need to return here. Replace our args with the new ones
+                    # and reuse our frame, it keeps the caller we return to.
+                    del stack[base:args_base]
+                    frame.func = func
+                else:
+                    calls.append((code, pc, end, base, frame, key))
+                    base = args_base
+                    if pool:
+                        new_frm = pool.pop()
+                        new_frm.caller_frm = frame
+                        new_frm.caller_tok = tok
+                        new_frm.func = func
+                        frame = new_frm
+                    else:
+                        frame = Frame(frame, tok, [], func)
+                code = func._code
+                end = len(code)
+                pc = 0
+            elif op == OP_CONST:
+                stack.append(arg)
+            elif op == OP_JUMP_IF_FALSE:
+                if not stack.pop():
+                    pc = arg
+            elif op == OP_JUMP:
+                pc = arg
+            else:
+                try:
+                    handlers[op](arg, tok, stack, frame)  # type: ignore [misc]
+                except AttoRuntimeError as e:
+                    # add the frames of the calls the Compiler has inlined
+                    for call_tok, func in frame.func._inlined.get(pc - 1, ()):
+                        e.frame = Frame(e.frame, call_tok, [], func)
+                    raise
+
+    # Opcode handlers, each pops its operands and pushes its result.
+    # The Compiler ensures the stack holds the operands each one needs.
+    # Register a new handler with @op(opcode).
+    # Arithmetic handlers test for the common case of float operands first,
+    # the full type check is only done when that test fails.
+
+    @op(OP_ADD)
+    def _op_add(self, arg: tuple, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        if type(left) is not float or type(right) is not float:
+            self.check_type(left, (float, str), arg[0], frame)
+            self.check_type(right, (float, str), arg[1], frame)
+        stack.append(left + right)  # type: ignore [operator]
+
+    @op(OP_NEG)
+    def _op_neg(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        vlu = stack.pop()
+        if type(vlu) is not float:
+            self.check_type(vlu, (float,), tok, frame)
+        stack.append(-vlu)  # type: ignore [operator]
+
+    @op(OP_MUL)
+    def _op_mul(self, arg: tuple, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        if type(left) is not float or type(right) is not float:
+            self.check_type(left, (float,), arg[0], frame)
+            self.check_type(right, (float,), arg[1], frame)
+        stack.append(left * right)  # type: ignore [operator]
+
+    @op(OP_DIV)
+    def _op_div(self, arg: tuple, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        if type(left) is not float or type(right) is not float:
+            self.check_type(left, (float,), arg[0], frame)
+            self.check_type(right, (float,), arg[1], frame)
+        stack.append(left / right)  # type: ignore [operator]
+
+    @op(OP_INV)
+    def _op_inv(self, arg: tuple, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is not float:
+            self.check_type(left, (float,), arg[0], frame)
+        stack.append(1 / left)  # type: ignore [operator]
+
+    @op(OP_REM)
+    def _op_rem(self, arg: tuple, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        if type(left) is not float or type(right) is not float:
+            self.check_type(left, (float,), arg[0], frame)
+            self.check_type(right, (float,), arg[1], frame)
+        stack.append(left % right)  # type: ignore [operator]
+
+    @op(OP_EQ)
+    def _op_eq(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        stack.append(left == right)
+
+    @op(OP_LESS)
+    def _op_less(self, arg: tuple, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        if type(left) is not float or type(right) is not float:
+            self.check_type(left, (float, str), arg[0], frame)
+            self.check_type(right, (float, str), arg[1], frame)
+        stack.append(left < right)  # type: ignore [operator]
+
+    @op(OP_HEAD)
+    def _op_head(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is list or type(left) is str:
+            stack.append(left[0] if left else None)
+        else:
+            stack.append(None)
 
-                # do the call
-                new_frm = Frame(frame, node.token, args, new_func)
-                return self._eval_node(new_func.body, new_frm)
+    @op(OP_TAIL)
+    def _op_tail(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is list or type(left) is str:
+            stack.append(left[1:] if len(left) > 1 else None)
+        else:
+            stack.append(None)
+
+    @op(OP_PAIR)
+    def _op_pair(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+        stack.append(cast(Value, [left, right]))
+
+    @op(OP_FUSE)
+    def _op_fuse(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        right = stack.pop()
+        left = stack.pop()
+
+        # never change left or right, other values may share the same list
+        if type(left) is list:
+            if type(right) is list:
+                stack.append(cast(Value, left + right))
+            else:
+                stack.append(cast(Value, [*left, right]))
+        elif type(right) is list:
+            stack.append(cast(Value, [left, *right]))
+        else:
+            stack.append(cast(Value, [left, right]))
+
+    @op(OP_LITR)
+    def _op_litr(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is float:
+            stack.append(left)
+            return
+        elif type(left) is str:
+            try:
+                stack.append(float(left))
+                return
+            except ValueError:
+                pass
+        # also catches when left is a list
+        self._raise_litr(left, tok, frame)
+
+    @op(OP_STR)
+    def _op_str(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is list:
+            stack.append(" ".join(map(str, left)))
+        else:
+            stack.append(str(left))
 
-            case _:
-                raise AttoRuntimeError(
-                    f"Unhandled token type {node.token.type}", node.token, frame
-                )
+    @op(OP_WORDS)
+    def _op_words(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is str:
+            stack.append(cast(Value, left.split()))
+        else:
+            stack.append(None)
 
-        return None  # make mypy happy
+    @op(OP_IN)
+    def _op_in(self, arg: bool, tok: Token, stack: List[Value], frame: Frame):
+        if arg:
+            stack.append(input(stack.pop()))
+        else:
+            stack.append(input())
+
+    @op(OP_OUT)
+    def _op_out(self, arg, tok: Token, stack: List[Value], frame: Frame):
+        left = stack.pop()
+        if type(left) is bool:
+            print(str(left).lower())
+        elif left is None:
+            print("null")
+        else:
+            print(left)
+        stack.append(None)
 
-    def check_type(self, vlu: Value, types: tuple, node: ASTnode | None, frm: Frame):
+    def check_type(self, vlu: Value, types: tuple, tok: Token, frm: Frame):
         """Checks whether type is of type, raises an error otherwise
 
         Parameters
@@ -430,16 +656,21 @@ class Interpreter:
             The value to check
         types : tuple[any]
             A list of valid types
-        node : ASTnode
-            The ASTnode to generate the error from
+        tok : Token
+            The Token to generate the error from
         frm : Frame
             The frame to generate the error from
         """
 
-        for t in types:
-            if isinstance(vlu, t):
-                return
+        if not isinstance(vlu, types):
+            self._raise_type(vlu, types, tok, frm)
 
-        assert node is not None
+    # Errors are built in these helpers, so that the handlers only contain
+    # the code that runs when there is no error.
+
+    def _raise_type(self, vlu: Value, types: tuple, tok: Token, frm: Frame) -> NoReturn:
         msg = f"Expected types {[type(t) for t in types]} but got {type(vlu)}"
-        raise AttoRuntimeError(msg, node.token, frm)  # type: ignore [arg-type]
+        raise AttoRuntimeError(msg, tok, frm)
+
+    def _raise_litr(self, vlu: Value, tok: Token, frm: Frame) -> NoReturn:
+        raise AttoRuntimeError(f"Failed to convert {vlu} to number", tok, frm)
@@ -1,9 +1,12 @@
 """This module tokenizes the source text."""
 
 from __future__ import annotations
-from enum import Enum
+from enum import Enum, IntEnum
+import re
+from bisect import bisect_right
 from typing import List, Tuple
 from pathlib import Path
+from sys import intern
 
 
 class AttoSyntaxError(SyntaxError):
@@ -22,9 +25,13 @@ class AttoSyntaxError(SyntaxError):
         super().__init__(f"{msg} {tok.lexer.path.name}:{line} col: {col}")
 
 
-class TokenTypes(Enum):
+class TokenTypes(IntEnum):
     """Lexical tokens"""
 
+    # show the name, not the int, in error messages such as "Expected TokenTypes.IS"
+    __str__ = Enum.__str__
+    __format__ = Enum.__format__
+
     FN = 1
     IS = 2
     IDENT = 3  # may be a built_in, decide when token is closed
@@ -65,6 +72,37 @@ class TokenTypes(Enum):
     FAIL = 100
 
 
+# source text of built in things -> their token type
+_KEYWORDS = {
+    "__add": TokenTypes.ADD,
+    "__neg": TokenTypes.NEG,
+    "__mul": TokenTypes.MUL,
+    "__div": TokenTypes.DIV,
+    "__rem": TokenTypes.REM,
+    "__inv": TokenTypes.INV,
+    "__eq": TokenTypes.EQ,
+    "__lt": TokenTypes.LESS,
+    "__head": TokenTypes.HEAD,
+    "__tail": TokenTypes.TAIL,
+    "__fuse": TokenTypes.FUSE,
+    "__pair": TokenTypes.PAIR,
+    "__litr": TokenTypes.LITR,
+    "__str": TokenTypes.STR,
+    "__words": TokenTypes.WORDS,
+    "__input": TokenTypes.IN,
+    "__print": TokenTypes.OUT,
+    "fn": TokenTypes.FN,
+    "is": TokenTypes.IS,
+    "if": TokenTypes.IF,
+    "true": TokenTypes.TRUE,
+    "false": TokenTypes.FALSE,
+    "null": TokenTypes.NULL,
+}
+
+# marks that the value of a Token is not computed yet
+_NO_VALUE = object()
+
+
 class Token:
     """Hold info for one lexical token
 
@@ -81,6 +119,8 @@ class Token:
 
     """
 
+    __slots__ = ("lexer", "type", "start_pos", "end_pos", "_text", "_value")
+
     def __init__(
         self, lexer: Lexer, type: TokenTypes, start_pos: int, end_pos: int = -1
     ):
@@ -88,6 +128,8 @@ class Token:
         self.type = type
         self.start_pos = start_pos
         self.end_pos = end_pos
+        self._text = ""
+        self._value: str | float | bool | None | object = _NO_VALUE
 
         if end_pos > -1:
             self.close(end_pos)
@@ -102,56 +144,11 @@ class Token:
         """
 
         self.end_pos = end_pos
+        self._text = self.lexer.source[self.start_pos : end_pos]
 
         # decide if IDENT was a build in thing
         if self.type == TokenTypes.IDENT:
-            match self.text():
-                case "__add":
-                    self.type = TokenTypes.ADD
-                case "__neg":
-                    self.type = TokenTypes.NEG
-                case "__mul":
-                    self.type = TokenTypes.MUL
-                case "__div":
-                    self.type = TokenTypes.DIV
-                case "__rem":
-                    self.type = TokenTypes.REM
-                case "__inv":
-                    self.type = TokenTypes.INV
-                case "__eq":
-                    self.type = TokenTypes.EQ
-                case "__lt":
-                    self.type = TokenTypes.LESS
-                case "__head":
-                    self.type = TokenTypes.HEAD
-                case "__tail":
-                    self.type = TokenTypes.TAIL
-                case "__fuse":
-                    self.type = TokenTypes.FUSE
-                case "__pair":
-                    self.type = TokenTypes.PAIR
-                case "__litr":
-                    self.type = TokenTypes.LITR
-                case "__str":
-                    self.type = TokenTypes.STR
-                case "__words":
-                    self.type = TokenTypes.WORDS
-                case "__input":
-                    self.type = TokenTypes.IN
-                case "__print":
-                    self.type = TokenTypes.OUT
-                case "fn":
-                    self.type = TokenTypes.FN
-                case "is":
-                    self.type = TokenTypes.IS
-                case "if":
-                    self.type = TokenTypes.IF
-                case "true":
-                    self.type = TokenTypes.TRUE
-                case "false":
-                    self.type = TokenTypes.FALSE
-                case "null":
-                    self.type = TokenTypes.NULL
+            self.type = _KEYWORDS.get(self._text, TokenTypes.IDENT)
 
     def text(self) -> str:
         """The text value for this token extracted from source text
@@ -161,9 +158,7 @@ class Token:
         str : The source text for this token
 
         """
-        if self.end_pos < 0:
-            return ""
-        return self.lexer.source[self.start_pos : self.end_pos]
+        return self._text
 
     def value(self) -> str | float | bool | None:
         """Get the as correct type
@@ -172,24 +167,35 @@ class Token:
         If a number convert to a float and return
         All other return the text in the source text
 
+        The value is computed once and then remembered. Strings are interned,
+        so that equal strings in the source share the same object.
+
         Returns
         -------
         str | float : The value stored in src text,
         """
+        if self._value is not _NO_VALUE:
+            return self._value  # type: ignore [return-value]
+
         txt = self.text()
+        vlu: str | float | bool | None
         match self.type:
             case TokenTypes.NUMBER:
-                return float(txt)
+                vlu = float(txt)
             case TokenTypes.STRING:
-                return txt[1:-1]
+                vlu = intern(txt[1:-1])
             case TokenTypes.TRUE:
-                return True
+                vlu = True
             case TokenTypes.FALSE:
-                return False
+                vlu = False
             case TokenTypes.NULL:
-                return None
+                vlu = None
             case _:
-                return txt
+                vlu = intern(txt)
+
+        if self.end_pos > -1:  # an open token has no text yet
+            self._value = vlu
+        return vlu
 
     def line_col(self) -> Tuple[int, int]:
         """Get the line and column in the source text this token begins at.
@@ -199,29 +205,49 @@ class Token:
         tuple[int, int] : The line and column in source text
 
         """
-        line, col = 1, 0
-        for i, c in enumerate(self.lexer.source):
-            if i == self.start_pos:
-                break
-
-            if c == "\n":
-                line, col = line + 1, 0
-            else:
-                col += 1
-
-        return line, col
+        starts = self.lexer.line_starts
+        line = bisect_right(starts, self.start_pos)
+        return line, self.start_pos - starts[line - 1]
 
     def is_type(self, type: TokenTypes):
         return self.type == type
 
 
-class LexerStates(Enum):
-    """The different states the lexer state machine can be in"""
+def find_line_starts(source: str) -> List[int]:
+    """Find the position in source where each line begins.
 
-    DEFAULT = 0
-    NUMBER = 1
-    STRING = 2
-    IDENT = 3
+    Parameters
+    ----------
+    source : str
+        The source text
+
+    Returns
+    -------
+    List[int] : The start position of each line in order, the first one is 0
+
+    """
+    starts = [0]
+    pos = source.find("\n")
+    while pos != -1:
+        starts.append(pos + 1)
+        pos = source.find("\n", pos + 1)
+    return starts
+
+
+# One token per match, named by its TokenTypes, a match without a named
+# group is whitespace. A number ends at the first char that isn't a digit
+# or ".", and that char is skipped. A string ends at a " that doesn't follow
+# a \ or at the end of the source. An identifier runs until whitespace.
+_TOKEN_RE = re.compile(
+    r"""
+      (?P<NUMBER>\d[\d.]*)(?:.|\Z)
+    | (?P<STRING>"(?:[^"]|(?<=\\)")*"?)
+    | (?P<IDENT>[^\s\x00-\x1f]\S*)
+    | \s+
+    | (?P<FAIL>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
 
 
 class Lexer:
@@ -243,47 +269,17 @@ class Lexer:
     def __init__(self, source: str, path: Path):
         self.source: str = source
         self.path: Path = path
+        self.line_starts: List[int] = find_line_starts(source)
         self.tokens: List[Token] = []
-        self._state = LexerStates.DEFAULT
-        self._token: Token | None = None
-
-        for i, c in enumerate(source):
-            if self._state == LexerStates.DEFAULT:
-                if c.isdigit():
-                    self._begin_token(LexerStates.NUMBER, TokenTypes.NUMBER, i)
-                elif c.isspace():  # whitespace ignore
-                    continue
-                elif c == '"':
-                    self._begin_token(LexerStates.STRING, TokenTypes.STRING, i)
-                elif c > " ":
-                    self._begin_token(LexerStates.IDENT, TokenTypes.IDENT, i)
-                else:
-                    tok = Token(self, TokenTypes.FAIL, i)
-                    tok.close(i + 1)
-                    raise AttoSyntaxError("Unrecognized char", tok)
-
-            elif self._state == LexerStates.NUMBER:
-                if not c.isdigit() and c != ".":
-                    self._end_token(i)
-            elif self._state == LexerStates.IDENT:
-                if c.isspace():
-                    self._end_token(i)
-            else:  # string
-                if c == '"' and source[i - 1] != "\\":
-                    self._end_token(i + 1)
-
-        # possible dangling last token
-        if self._token:
-            self._token.close(len(source))
-            self.tokens.append(self._token)
-
-    def _begin_token(self, state: LexerStates, type: TokenTypes, pos: int) -> None:
-        self._state = state
-        self._token = Token(self, type, pos)
-
-    def _end_token(self, end_pos: int):
-        if self._token:
-            self._token.close(end_pos)
-            self.tokens.append(self._token)
-        self._token = None
-        self._state = LexerStates.DEFAULT
+        # looked up once here rather than for each token
+        append = self.tokens.append
+        types = TokenTypes.__members__
+        for match in _TOKEN_RE.finditer(source):
+            kind = match.lastgroup
+            if kind is None:  # whitespace ignore
+                continue
+            start, end = match.span(kind)
+            if kind == "FAIL":
+                tok = Token(self, TokenTypes.FAIL, start, end)
+                raise AttoSyntaxError("Unrecognized char", tok)
+            append(Token(self, types[kind], start, end))
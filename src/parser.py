@@ -5,7 +5,7 @@ Output is an Abstract syntax tree that the interpreter uses.
 """
 
 from __future__ import annotations
-from typing import Dict, List
+from typing import Dict, List, Sequence
 from src.lexer import Token, TokenTypes, Lexer, AttoSyntaxError
 from pathlib import Path
 
@@ -17,7 +17,20 @@ class EOFerror(Exception):
 
 
 class ASTnode:
-    """A node in the Abstract syntax tree"""
+    """A node in the Abstract syntax tree
+
+    Attributes
+    ----------
+    arg_slot : int | None
+        For a parameter identifier, the index of the parameter in the args
+    call_target : Func | None
+        For a function call, the function that is called
+    arg_nodes : Sequence[ASTnode | None]
+        For a function call, the argument expressions in call order,
+        an empty tuple for all other nodes
+    """
+
+    __slots__ = ("left", "right", "token", "arg_slot", "call_target", "arg_nodes")
 
     def __init__(
         self,
@@ -28,6 +41,9 @@ class ASTnode:
         self.left: ASTnode | None = left
         self.right: ASTnode | None = right
         self.token: Token | None = token
+        self.arg_slot: int | None = None
+        self.call_target: Func | None = None
+        self.arg_nodes: Sequence[ASTnode | None] = ()
 
 
 class Func:
@@ -48,13 +64,34 @@ class Func:
         A root for the AST tree for the body of this function
     late_binding_start_pos : int
         The body pos for this function, used to do late binding of identifiers
+    pure : bool | None
+        True when neither this function nor any function it calls does
+        input or output, None until the Parser has inferred it
+    _code : list | None
+        The compiled instructions for the body, set by the Compiler
+    _inlined : dict
+        The InlineChain for each inlined instruction in _code,
+        by its index, set by the Compiler
     """
 
+    __slots__ = (
+        "name_tok",
+        "parm",
+        "body",
+        "late_binding_start_pos",
+        "pure",
+        "_code",
+        "_inlined",
+    )
+
     def __init__(self, name_tok: Token):
         self.name_tok: Token = name_tok
         self.parm: List[Token] = []
         self.body: ASTnode | None
         self.late_binding_start_pos: int | None
+        self.pure: bool | None = None
+        self._code: list | None = None
+        self._inlined: dict = {}
 
     def name(self) -> str:
         """Get the name of the function"""
@@ -65,6 +102,27 @@ class Func:
         return [tok.value() for tok in self.parm]
 
 
+# operator token type -> the number of operands it takes
+_OPERANDS: Dict[TokenTypes, int] = {
+    TokenTypes.ADD: 2,
+    TokenTypes.NEG: 1,
+    TokenTypes.MUL: 2,
+    TokenTypes.DIV: 2,
+    TokenTypes.INV: 1,
+    TokenTypes.REM: 2,
+    TokenTypes.EQ: 2,
+    TokenTypes.LESS: 2,
+    TokenTypes.HEAD: 1,
+    TokenTypes.TAIL: 1,
+    TokenTypes.PAIR: 2,
+    TokenTypes.FUSE: 2,
+    TokenTypes.LITR: 1,
+    TokenTypes.STR: 1,
+    TokenTypes.WORDS: 1,
+    TokenTypes.OUT: 1,
+}
+
+
 class Parser:
     """The parser class, build the AST tree
 
@@ -101,20 +159,30 @@ class Parser:
         except IndexError:
             raise EOFerror()
 
+    def _peek(self) -> Token | None:
+        # the next token without moving past it, None at the end
+        pos = self._pos + 1
+        return self.lexer.tokens[pos] if pos < len(self.lexer.tokens) else None
+
     def _last_body_pos(self):
-        while tok := self._next():
-            if tok.is_type(TokenTypes.FN):
-                self._back()
+        # skip the body, it is parsed once all function names are known
+        tokens = self.lexer.tokens
+        for pos in range(self._pos + 1, len(tokens)):
+            if tokens[pos].type is TokenTypes.FN:
+                self._pos = pos - 1
                 return self._pos
+        self._pos = len(tokens)
+        raise EOFerror()
 
     def _expect(self, tok_type: TokenTypes) -> Token:
         tok = self._next()
-        if not tok.is_type(tok_type):
+        if tok.type is not tok_type:
             raise AttoSyntaxError(f"Expected {tok_type}", tok)
 
         return tok
 
     def _parse_funcs(self) -> None:
+        inherited = dict(self.funcs)
         try:
             while True:
                 self._expect(TokenTypes.FN)
@@ -122,9 +190,12 @@ class Parser:
         except EOFerror:
             pass
 
+        self._rebind_inherited(inherited)
         for func in self.funcs.values():
             self._parse_late_binding(func)
 
+        self._infer_purity()
+
     def _parse_func_sig(self) -> None:
         self._cur_func = Func(self._expect(TokenTypes.IDENT))
         self.funcs[self._cur_func.name_tok.text()] = self._cur_func
@@ -144,19 +215,110 @@ class Parser:
         self._last_body_pos()
 
     def _parse_fn_args(self, func: Func) -> None:
-        while tok := self._next():
-            if not tok.is_type(TokenTypes.IDENT):
-                self._back()
-                break
-            func.parm.append(tok)
+        while (tok := self._peek()) is not None and tok.type is TokenTypes.IDENT:
+            func.parm.append(self._next())
 
     def _parse_late_binding(self, func: Func):
         if func.late_binding_start_pos is not None:
             self._cur_func = func
+            # param name -> its index in args, the first one wins on duplicates
+            self._slots: Dict[str, int] = {}
+            for i, name in enumerate(func.params()):
+                self._slots.setdefault(name, i)
             self._pos = func.late_binding_start_pos
             func.body = self._parse_expr()
             func.late_binding_start_pos = None
 
+    def _rebind_inherited(self, inherited: Dict[str, Func]) -> None:
+        # The bodies of functions passed in, such as corelib, are already bound
+        # to the functions they call. When this source redefines one of them,
+        # each inherited function that calls it, directly or indirectly, is
+        # replaced by a copy that calls the functions in self.funcs instead.
+        # The inherited Func objects themselves are shared and never changed.
+        overridden = [
+            name for name, func in inherited.items() if self.funcs[name] is not func
+        ]
+        if not overridden:
+            return
+
+        callers: Dict[str, List[str]] = {}
+        for name, func in inherited.items():
+            for callee in self._callees(func.body):
+                callers.setdefault(callee, []).append(name)
+
+        stale: List[str] = []
+        todo = list(overridden)
+        while todo:
+            for name in callers.get(todo.pop(), ()):
+                if name not in stale and self.funcs[name] is inherited[name]:
+                    stale.append(name)
+                    todo.append(name)
+
+        for name in stale:
+            func = Func(inherited[name].name_tok)
+            func.parm = inherited[name].parm
+            func.late_binding_start_pos = None
+            self.funcs[name] = func
+        for name in stale:
+            self.funcs[name].body = self._copy_node(inherited[name].body)
+
+    def _callees(self, node: ASTnode | None) -> List[str]:
+        # the names of all functions called in the tree of node
+        names = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if node is None:
+                continue
+            if node.token is not None and node.token.type == TokenTypes.CALL:
+                names.append(node.token.text())
+                nodes.extend(node.arg_nodes)
+            nodes.extend((node.left, node.right))
+        return names
+
+    def _copy_node(self, node: ASTnode | None) -> ASTnode | None:
+        # copy the tree of node, with calls bound to the functions in self.funcs
+        if node is None:
+            return None
+        copy = ASTnode(
+            node.token, self._copy_node(node.left), self._copy_node(node.right)
+        )
+        copy.arg_slot = node.arg_slot
+        if node.call_target is not None:
+            copy.call_target = self.funcs[node.token.text()]  # type: ignore [union-attr]
+            copy.arg_nodes = [self._copy_node(arg) for arg in node.arg_nodes]
+        return copy
+
+    def _infer_purity(self) -> None:
+        # Functions from corelib are already inferred, the rest starts as
+        # pure unless its own body does input or output. Then each function
+        # that calls an impure function is marked impure, until nothing changes.
+        funcs = [func for func in self.funcs.values() if func.pure is None]
+        callees: Dict[int, List[Func]] = {}
+        for func in funcs:
+            func.pure = True
+            callees[id(func)] = []
+            nodes = [func.body]
+            while nodes:
+                node = nodes.pop()
+                if node is None:
+                    continue
+                if node.token is not None:
+                    if node.token.type in (TokenTypes.IN, TokenTypes.OUT):
+                        func.pure = False
+                    elif node.token.type == TokenTypes.CALL:
+                        callees[id(func)].append(node.call_target)  # type: ignore [arg-type]
+                        nodes.extend(node.arg_nodes)
+                nodes.extend((node.left, node.right))
+
+        changed = True
+        while changed:
+            changed = False
+            for func in funcs:
+                if func.pure and not all(f.pure for f in callees[id(func)]):
+                    func.pure = False
+                    changed = True
+
     def _parse_expr(self) -> ASTnode | None:
         while tok := self._next():
             match tok.type:
@@ -164,13 +326,12 @@ class Parser:
                     self._back()  # reached end of function body
                     return None
                 case TokenTypes.IDENT:
-                    if tok.text() in self._cur_func.params():
-                        return ASTnode(tok)  # reached end of chain
-                    elif tok.text() in self.funcs:
-                        return self._parse_call(tok)
-                    raise AttoSyntaxError(
-                        f"Could not find identifier {tok.text()} at", tok
-                    )
+                    name = tok.text()
+                    if name in self._slots:
+                        return self._parse_param(tok)  # reached end of chain
+                    elif name in self.funcs:
+                        return self._parse_call(tok, self.funcs[name])
+                    raise AttoSyntaxError(f"Could not find identifier {name} at", tok)
                 case (
                     TokenTypes.STRING
                     | TokenTypes.NUMBER
@@ -192,57 +353,33 @@ class Parser:
                     elif node.right.right is None:  # type: ignore[union-attr]
                         raise AttoSyntaxError("Expected false expression", tok)
                     return node
-                case TokenTypes.ADD:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.NEG:
-                    return ASTnode(tok, self._parse_expr())
-                case TokenTypes.MUL:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.DIV:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.INV:
-                    return ASTnode(tok, self._parse_expr())
-                case TokenTypes.REM:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.EQ:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.LESS:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.HEAD:
-                    return ASTnode(tok, self._parse_expr())
-                case TokenTypes.TAIL:
-                    return ASTnode(tok, self._parse_expr())
-                case TokenTypes.PAIR:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.FUSE:
-                    return ASTnode(tok, self._parse_expr(), self._parse_expr())
-                case TokenTypes.LITR:
-                    return ASTnode(tok, self._parse_expr())
-                case TokenTypes.STR:
-                    return ASTnode(tok, self._parse_expr())
-                case TokenTypes.WORDS:
-                    return ASTnode(tok, self._parse_expr())
                 case TokenTypes.IN:
                     ident = self._expect(TokenTypes.IDENT)
-                    return ASTnode(tok, ASTnode(ident))
-                case TokenTypes.OUT:
-                    return ASTnode(tok, self._parse_expr())
+                    if ident.text() not in self._slots:
+                        raise AttoSyntaxError(
+                            f"Could not find identifier {ident.text()} at", ident
+                        )
+                    return ASTnode(tok, self._parse_param(ident))
                 case _:
+                    n_operands = _OPERANDS.get(tok.type)
+                    if n_operands == 2:
+                        return ASTnode(tok, self._parse_expr(), self._parse_expr())
+                    elif n_operands == 1:
+                        return ASTnode(tok, self._parse_expr())
                     raise AttoSyntaxError(f"Unexpected token: {tok.type} at", tok)
         return None
 
-    def _parse_call(self, tok: Token):
+    def _parse_param(self, tok: Token) -> ASTnode:
+        # resolve the parameter once here instead of each time it is evaluated
+        node = ASTnode(tok)
+        node.arg_slot = self._slots[tok.text()]
+        return node
+
+    def _parse_call(self, tok: Token, func: Func):
         tok.type = TokenTypes.CALL
         # grab as many parameters as there are in the function definition
-        func = self.funcs[tok.text()]
         args = [self._parse_expr() for _ in func.parm]
         node = ASTnode(tok)
-
-        if args:
-            # store the actual arg in the right slot, leave left for next args
-            n = node.left = ASTnode(None, None, args.pop(0))
-            while args:
-                n.left = ASTnode(None, None, args.pop(0))
-                n = n.left
-
+        node.call_target = func
+        node.arg_nodes = args
         return node
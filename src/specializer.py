@@ -0,0 +1,300 @@
+"""This module specializes atto functions into python source code.
+
+Instead of letting the virtual machine step through instructions, each atto
+function is turned into a python function. Running these lets the python VM do
+all of the work, which removes our own dispatch overhead entirely.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Set, Tuple
+
+from src.parser import ASTnode, Func
+from src.lexer import Token, TokenTypes
+
+# the context for error messages,
+# (operand tokens followed by the operator token, the func they are in)
+ErrorCtx = Tuple[Tuple[Token, ...], Func]
+
+
+class Specializer:
+    """Generates python source for a program, one python function per atto Func
+
+    The generated functions are named _f0, _f1 ... as atto function names
+    such as + or = are not valid python names. Parameters are named a0, a1 ...
+    by their position. The body becomes one python expression:
+    an if becomes a conditional expression, a call becomes a direct call to
+    the generated python function and operators calls the helpers in this
+    module, as those need the same type checks as the virtual machine does.
+
+    Attributes
+    ----------
+    ctx : List[ErrorCtx]
+        Context for each operator, used to create error messages.
+        The generated code expects them in its namespace as _c0, _c1 ...
+    """
+
+    def __init__(self):
+        self.ctx: List[ErrorCtx] = []
+        self._names: Dict[int, str] = {}
+        self._func: Func
+
+    def generate(self, main: Func) -> str:
+        """Generate python source for main and all functions it may call.
+
+        Parameters
+        ----------
+        main : Func
+            The entry point of the program, generated as _f0
+
+        Returns
+        -------
+        str : The python source code
+        """
+
+        funcs = self._reachable(main)
+        self._names = {id(func): f"_f{i}" for i, func in enumerate(funcs)}
+
+        source = []
+        for func in funcs:
+            self._func = func
+            args = ", ".join(f"a{i}" for i in range(len(func.parm)))
+            body = "None" if func.body is None else self._expr(func.body)
+            source.append(
+                f"def {self._names[id(func)]}({args}):\n"
+                f"    # atto: {func.name()}\n"
+                f"    return {body}\n"
+            )
+
+        return "\n".join(source)
+
+    def _reachable(self, main: Func) -> List[Func]:
+        funcs: List[Func] = []
+        seen: Set[int] = set()
+        todo = [main]
+        while todo:
+            func = todo.pop()
+            if id(func) in seen:
+                continue
+            seen.add(id(func))
+            funcs.append(func)
+            nodes = [func.body]
+            while nodes:
+                node = nodes.pop()
+                if node is None:
+                    continue
+                if node.token and node.token.type == TokenTypes.CALL:
+                    todo.append(node.call_target)  # type: ignore [arg-type]
+                    nodes.extend(node.arg_nodes)
+                nodes.extend((node.left, node.right))
+
+        return funcs
+
+    def _expr(self, node: ASTnode | None) -> str:
+        assert node is not None
+        assert node.token is not None
+        tok = node.token
+
+        match tok.type:
+            case TokenTypes.IDENT:
+                return f"a{node.arg_slot}"
+            case (
+                TokenTypes.NUMBER
+                | TokenTypes.STRING
+                | TokenTypes.TRUE
+                | TokenTypes.FALSE
+                | TokenTypes.NULL
+            ):
+                return repr(tok.value())
+            case TokenTypes.IF:
+                # The parser ensures all 3 branches are populated.
+                cond = node.left
+                true_node = node.right.left  # type: ignore [union-attr]
+                false_node = node.right.right  # type: ignore [union-attr]
+                if cond.token.type in _LITERALS:  # type: ignore [union-attr]
+                    # the condition is known, only generate the branch taken
+                    taken = true_node if cond.token.value() else false_node  # type: ignore [union-attr]
+                    return self._expr(taken)
+                true = self._expr(true_node)
+                false = self._expr(false_node)
+                return f"({true} if {self._expr(cond)} else {false})"
+            case TokenTypes.EQ:
+                return f"({self._expr(node.left)} == {self._expr(node.right)})"
+            case TokenTypes.PAIR:
+                return f"[{self._expr(node.left)}, {self._expr(node.right)}]"
+            case TokenTypes.IN:
+                return f"input({self._expr(node.left)})"
+            case TokenTypes.CALL:
+                args = [self._expr(arg) for arg in node.arg_nodes]
+                name = self._names[id(node.call_target)]
+                return f"{name}({', '.join(args)})"
+            case _:
+                helper = _HELPERS[tok.type]
+                operands = [node.left] if node.right is None else [node.left, node.right]
+                tokens: List[Token] = []
+                for operand in operands:
+                    assert operand is not None and operand.token is not None
+                    tokens.append(operand.token)
+                self.ctx.append((tuple(tokens) + (tok,), self._func))
+                args = [self._expr(n) for n in operands]
+                return f"{helper}({', '.join(args)}, _c{len(self.ctx) - 1})"
+
+
+def _fail(msg: str, ctx: ErrorCtx, operand: int = 0):
+    # imported here as interpreter imports this module
+    from src.interpreter import AttoRuntimeError, Frame
+
+    tokens, func = ctx
+    raise AttoRuntimeError(msg, tokens[operand], Frame(None, None, [], func))
+
+
+def _check(vlu: Any, types: tuple, ctx: ErrorCtx, operand: int):
+    if not isinstance(vlu, types):
+        _fail(
+            f"Expected types {[type(t) for t in types]} but got {type(vlu)}",
+            ctx,
+            operand,
+        )
+
+
+# The helpers below implement the atto operators for specialized code,
+# they behave exactly as the handlers in the Interpreter. The last argument
+# is the ErrorCtx for the operator, found in the namespace as _c0, _c1 ...
+
+
+def _add(left, right, ctx):
+    if type(left) is not float or type(right) is not float:
+        _check(left, (float, str), ctx, 0)
+        _check(right, (float, str), ctx, 1)
+    return left + right
+
+
+def _neg(vlu, ctx):
+    if type(vlu) is not float:
+        _check(vlu, (float,), ctx, -1)
+    return -vlu
+
+
+def _mul(left, right, ctx):
+    if type(left) is not float or type(right) is not float:
+        _check(left, (float,), ctx, 0)
+        _check(right, (float,), ctx, 1)
+    return left * right
+
+
+def _div(left, right, ctx):
+    if type(left) is not float or type(right) is not float:
+        _check(left, (float,), ctx, 0)
+        _check(right, (float,), ctx, 1)
+    return left / right
+
+
+def _inv(vlu, ctx):
+    if type(vlu) is not float:
+        _check(vlu, (float,), ctx, 0)
+    return 1 / vlu
+
+
+def _rem(left, right, ctx):
+    if type(left) is not float or type(right) is not float:
+        _check(left, (float,), ctx, 0)
+        _check(right, (float,), ctx, 1)
+    return left % right
+
+
+def _less(left, right, ctx):
+    if type(left) is not float or type(right) is not float:
+        _check(left, (float, str), ctx, 0)
+        _check(right, (float, str), ctx, 1)
+    return left < right
+
+
+def _head(vlu, ctx):
+    if type(vlu) is list or type(vlu) is str:
+        return vlu[0] if vlu else None
+    return None
+
+
+def _tail(vlu, ctx):
+    if type(vlu) is list or type(vlu) is str:
+        return vlu[1:] if len(vlu) > 1 else None
+    return None
+
+
+def _fuse(left, right, ctx):
+    if type(left) is list:
+        if type(right) is list:
+            return left + right
+        return [*left, right]
+    elif type(right) is list:
+        return [left, *right]
+    return [left, right]
+
+
+def _litr(vlu, ctx):
+    if type(vlu) is float:
+        return vlu
+    elif type(vlu) is str:
+        try:
+            return float(vlu)
+        except ValueError:
+            pass
+    _fail(f"Failed to convert {vlu} to number", ctx, -1)
+
+
+def _str(vlu, ctx):
+    if type(vlu) is list:
+        return " ".join(map(str, vlu))
+    return str(vlu)
+
+
+def _words(vlu, ctx):
+    if type(vlu) is str:
+        return vlu.split()
+    return None
+
+
+def _out(vlu, ctx):
+    if type(vlu) is bool:
+        print(str(vlu).lower())
+    elif vlu is None:
+        print("null")
+    else:
+        print(vlu)
+    return None
+
+
+# token types of literal values
+_LITERALS = frozenset(
+    (
+        TokenTypes.NUMBER,
+        TokenTypes.STRING,
+        TokenTypes.TRUE,
+        TokenTypes.FALSE,
+        TokenTypes.NULL,
+    )
+)
+
+# token type -> name of helper function
+_HELPERS = {
+    TokenTypes.ADD: "_add",
+    TokenTypes.NEG: "_neg",
+    TokenTypes.MUL: "_mul",
+    TokenTypes.DIV: "_div",
+    TokenTypes.INV: "_inv",
+    TokenTypes.REM: "_rem",
+    TokenTypes.LESS: "_less",
+    TokenTypes.HEAD: "_head",
+    TokenTypes.TAIL: "_tail",
+    TokenTypes.FUSE: "_fuse",
+    TokenTypes.LITR: "_litr",
+    TokenTypes.STR: "_str",
+    TokenTypes.WORDS: "_words",
+    TokenTypes.OUT: "_out",
+}
+
+
+def namespace(ctx: List[ErrorCtx]) -> Dict[str, Any]:
+    """Create the namespace the generated code is executed in"""
+    ns: Dict[str, Any] = {helper: globals()[helper] for helper in _HELPERS.values()}
+    ns.update((f"_c{i}", c) for i, c in enumerate(ctx))
+    return ns
@@ -1,6 +1,9 @@
 """Contains mock objects used in testing"""
 
+from src.lexer import find_line_starts
+
 
 class MockLexer:
     def __init__(self, source: str):
         self.source = source
+        self.line_starts = find_line_starts(source)
@@ -0,0 +1,160 @@
+import unittest
+from pathlib import Path
+
+from src.lexer import AttoSyntaxError
+from src.parser import Parser
+from src.compiler import (
+    Compiler,
+    OP_CONST,
+    OP_LOAD_ARG,
+    OP_JUMP,
+    OP_JUMP_IF_FALSE,
+    OP_CALL,
+    OP_TAIL_CALL,
+    OP_ADD,
+    OP_DIV,
+    OP_EQ,
+    OP_OUT,
+)
+
+
+def compile_src(src, name):
+    parser = Parser(src, Path())
+    return Compiler().compile(parser.funcs[name]), parser.funcs
+
+
+class TestCompiler(unittest.TestCase):
+    """Tests that Compiler emits the expected instructions"""
+
+    def ops(self, code):
+        return [(op, arg) for op, arg, _ in code]
+
+    def test_const(self):
+        code, _ = compile_src("fn test is 12", "test")
+        self.assertEqual(self.ops(code), [(OP_CONST, 12.0)])
+
+    def test_empty_body(self):
+        code, funcs = compile_src("fn test is fn other is 1", "test")
+        self.assertEqual(self.ops(code), [(OP_CONST, None)])
+        self.assertIs(funcs["test"]._code, code)
+
+    def test_load_arg(self):
+        code, _ = compile_src("fn test x y is __print y", "test")
+        self.assertEqual([op for op, _ in self.ops(code)], [OP_LOAD_ARG, OP_OUT])
+        self.assertEqual(code[0][1], 1)
+
+    def test_if(self):
+        code, _ = compile_src('fn test x is if __eq x 1 "a" "b"', "test")
+        self.assertEqual(
+            [op for op, _ in self.ops(code)],
+            [OP_LOAD_ARG, OP_CONST, OP_EQ, OP_JUMP_IF_FALSE, OP_CONST, OP_JUMP, OP_CONST],
+        )
+        self.assertEqual(code[3][1], 6)
+        self.assertEqual(code[5][1], 7)
+
+    def test_call(self):
+        src = """
+        fn add x y is __add y x
+        fn test is add 1 2
+        """
+        code, funcs = compile_src(src, "test")
+        self.assertEqual(
+            self.ops(code),
+            [(OP_CONST, 1.0), (OP_CONST, 2.0), (OP_TAIL_CALL, (funcs["add"], 2))],
+        )
+
+    def test_tail_call(self):
+        src = """
+        fn add x y is __add y x
+        fn test x is if x add 1 2 __print add 3 4
+        """
+        code, _ = compile_src(src, "test")
+        self.assertEqual(
+            [op for op, _ in self.ops(code)],
+            [OP_LOAD_ARG, OP_JUMP_IF_FALSE, OP_CONST, OP_CONST, OP_TAIL_CALL,
+             OP_JUMP, OP_CONST, OP_CONST, OP_CALL, OP_OUT],
+        )
+
+    def test_inline(self):
+        src = """
+        fn add x y is __add x y
+        fn test x is add x 2
+        """
+        code, funcs = compile_src(src, "test")
+        self.assertEqual([op for op, _ in self.ops(code)], [OP_LOAD_ARG, OP_CONST, OP_ADD])
+        [(call_tok, func)] = funcs["test"]._inlined[2]
+        self.assertEqual(call_tok.text(), "add")
+        self.assertIs(func, funcs["add"])
+
+    def test_inline_short_body(self):
+        src = """
+        fn first x y is x
+        fn test is __print first 1 2
+        """
+        code, funcs = compile_src(src, "test")
+        self.assertEqual(
+            self.ops(code)[:3],
+            [(OP_CONST, 1.0), (OP_CONST, 2.0), (OP_CALL, (funcs["first"], 2))],
+        )
+
+    def test_inline_duplicate_param(self):
+        src = """
+        fn dup x x is __add x x
+        fn test is __print dup 1 2
+        """
+        code, funcs = compile_src(src, "test")
+        self.assertEqual(self.ops(code)[2], (OP_CALL, (funcs["dup"], 2)))
+
+    def test_fold(self):
+        code, _ = compile_src('fn test is __str __add 1 __mul 2 3', "test")
+        self.assertEqual(self.ops(code), [(OP_CONST, "7.0")])
+
+    def test_fold_inlined(self):
+        src = """
+        fn - x y is __add x __neg y
+        fn test is - 5 3
+        """
+        code, funcs = compile_src(src, "test")
+        self.assertEqual(self.ops(code), [(OP_CONST, 2.0)])
+        self.assertEqual(funcs["test"]._inlined, {})
+
+    def test_fold_not_types(self):
+        code, _ = compile_src('fn test is __add 1 "a"', "test")
+        self.assertEqual([op for op, _ in self.ops(code)], [OP_CONST, OP_CONST, OP_ADD])
+        code, _ = compile_src("fn test is __div 1 0", "test")
+        self.assertEqual([op for op, _ in self.ops(code)], [OP_CONST, OP_CONST, OP_DIV])
+
+    def test_fold_if(self):
+        code, _ = compile_src('fn test is if __eq 1 2 "a" "b"', "test")
+        self.assertEqual(self.ops(code), [(OP_CONST, "b")])
+
+    def test_fold_after_if(self):
+        code, _ = compile_src("fn test x is __add if x 1 2 3", "test")
+        self.assertEqual(self.ops(code)[-1][0], OP_ADD)
+
+    def test_inline_if(self):
+        src = """
+        fn choose x is if x 1 2
+        fn test is __print choose true
+        """
+        code, _ = compile_src(src, "test")
+        self.assertEqual(
+            self.ops(code),
+            [(OP_CONST, True), (OP_JUMP_IF_FALSE, 4), (OP_CONST, 1.0),
+             (OP_JUMP, 5), (OP_CONST, 2.0), (OP_OUT, code[5][1])],
+        )
+
+    def test_missing_operand(self):
+        with self.assertRaisesRegex(
+            AttoSyntaxError, "Missing operand for __add at :1 col: 11"
+        ):
+            compile_src("fn test is __add 1\nfn other is 2", "test")
+
+    def test_missing_argument(self):
+        with self.assertRaisesRegex(
+            AttoSyntaxError, "Missing argument for f at :1 col: 11"
+        ):
+            compile_src("fn test is f\nfn f x is x", "test")
+
+if __name__ == "__main__":
+    unittest.main()
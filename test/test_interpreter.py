@@ -1,9 +1,12 @@
+import tracemalloc
 import unittest
 from contextlib import redirect_stdout
 from io import StringIO
 from pathlib import Path
 
 from src.interpreter import Interpreter, AttoMissingMainError, AttoRuntimeError
+from src.compiler import OP_ADD, OP_MUL, OP_PAIR
+from src.lexer import AttoSyntaxError
 
 TEST_DIR = Path(__file__).absolute().parent
 TEST_DATA_DIR = TEST_DIR.parent / "test_data"
@@ -12,11 +15,13 @@ TEST_DATA_DIR = TEST_DIR.parent / "test_data"
 class TestInterpreter(unittest.TestCase):
     """Tests that interpreter works"""
 
-    def setUp(self):
+    def reset_corelib(self):
+        # corelib is loaded once and shared, forget it to test loading it
         Interpreter._corelib_funcs = None
         Interpreter._corelib_code = None
 
     def test_init_no_corelib(self):
+        self.reset_corelib()
         interp = Interpreter(False)
         self.assertFalse(interp.use_corelib)
         self.assertIsNone(Interpreter._corelib_funcs)
@@ -35,10 +40,18 @@ class TestInterpreter(unittest.TestCase):
         self.assertEqual(f.getvalue(), "Hello world\n")
 
     def test_init(self):
+        self.reset_corelib()
         interp = Interpreter()
         self.assertTrue(interp.use_corelib)
         self.assertIsNotNone(Interpreter._corelib_funcs)
 
+    def test_corelib_shared(self):
+        interp = Interpreter()
+        with redirect_stdout(StringIO()):
+            interp.exec("fn main is print 1")
+        self.assertIs(interp.parser.funcs["print"], Interpreter._corelib_funcs["print"])
+        self.assertNotIn("main", Interpreter._corelib_funcs)
+
     def test_hello_world(self):
         interp = Interpreter()
         f = StringIO()
@@ -67,6 +80,22 @@ class TestInterpreter(unittest.TestCase):
             interp.exec(code)
         self.assertEqual(f.getvalue(), "Finished!\n")
 
+    def test_deep_recursion(self):
+        code = """
+            fn count_to n is
+                if = n 0
+                    print "Finished!"
+                count_to - n 1
+
+            fn main is
+                count_to 20000
+        """
+        interp = Interpreter()
+        f = StringIO()
+        with redirect_stdout(f):
+            interp.exec(code)
+        self.assertEqual(f.getvalue(), "Finished!\n")
+
     def test_exec_file(self):
         interp = Interpreter()
         f = StringIO()
@@ -237,6 +266,42 @@ class TestLanguagePrimitives(unittest.TestCase):
         res = self.run_code("fn main is print fuse pair 1 2 3")
         self.assertEqual(res, "[1.0, 2.0, 3.0]\n")
 
+    def test_call_unused_arg(self):
+        src = """
+        fn first x y is x
+        fn f a is + a first 1 2
+        fn main is print + f 100 first 10 20
+        """
+        res = self.run_code(src)
+        self.assertEqual(res, "111.0\n")
+
+    def test_call_duplicate_param(self):
+        src = """
+        fn a x x is x
+        fn main is print + a 1 2 10
+        """
+        res = self.run_code(src)
+        self.assertEqual(res, "11.0\n")
+
+    def test_corelib_override(self):
+        src = """
+        fn debug_enabled is true
+        fn main is debug "x" 5
+        """
+        res = self.run_code(src)
+        self.assertEqual(res, "DEBUG [x]: 5.0\n")
+        # corelib itself is not changed by the override
+        res = self.run_code('fn main is debug "x" 5')
+        self.assertEqual(res, "")
+
+    def test_fuse_keeps_left(self):
+        src = """
+        fn both l is pair fuse l 3 l
+        fn main is print both pair 1 2
+        """
+        res = self.run_code(src)
+        self.assertEqual(res, "[[1.0, 2.0, 3.0], [1.0, 2.0]]\n")
+
     def test_fuse_right_list(self):
         res = self.run_code("fn main is print fuse 1 pair 2 3")
         self.assertEqual(res, "[1.0, 2.0, 3.0]\n")
@@ -250,6 +315,126 @@ class TestLanguagePrimitives(unittest.TestCase):
         self.assertEqual(res, "['one', 'two']\n")
 
 
+class TestSpecializedPrimitives(TestLanguagePrimitives):
+    """Tests that specialized code behaves as the virtual machine"""
+
+    def run_code(self, source):
+        interp = Interpreter(specialize=True)
+        f = StringIO()
+        with redirect_stdout(f):
+            interp.exec(source)
+
+        return f.getvalue()
+
+    def test_factorial(self):
+        interp = Interpreter(specialize=True)
+        f = StringIO()
+        with redirect_stdout(f):
+            interp.exec_file(TEST_DATA_DIR / "factorial_testcode.at")
+
+        self.assertTrue(f.getvalue().endswith("fact(6.0) = 720.0\n"))
+
+    def test_error_location(self):
+        # errors point at the same token as in the virtual machine
+        for body in ('__add 1 __neg "x"', '__add 1 __inv "x"', '__mul 2 "x"',
+                     '__add 1 null', '__litr "x"'):
+            src = f"fn main is __print {body}"
+            msgs = []
+            for specialize in (False, True):
+                with self.assertRaises(AttoRuntimeError) as ctx:
+                    Interpreter(specialize=specialize).exec(src)
+                msgs.append(str(ctx.exception).splitlines()[0])
+            self.assertEqual(msgs[0], msgs[1], body)
+
+    def test_runtime_error(self):
+        src = """
+        fn one is print litr "hej"
+        fn main is one
+        """
+        interp = Interpreter(specialize=True)
+        with self.assertRaisesRegex(AttoRuntimeError, "Failed .* convert"):
+            interp.exec(src)
+
+
+class TestMemoizedPrimitives(TestLanguagePrimitives):
+    """Tests that memoizing pure functions does not change the behaviour"""
+
+    def run_code(self, source):
+        interp = Interpreter(memoize=True)
+        f = StringIO()
+        with redirect_stdout(f):
+            interp.exec(source)
+
+        return f.getvalue()
+
+    def run_counted(self, source, opcode):
+        # run source and count how often the VM executes opcode
+        interp = Interpreter(memoize=True)
+        count = [0]
+        handler = interp._handlers[opcode]
+
+        def counted(*args):
+            count[0] += 1
+            handler(*args)
+
+        handlers = interp._handlers
+        interp._handlers = handlers[:opcode] + (counted,) + handlers[opcode + 1 :]
+        f = StringIO()
+        with redirect_stdout(f):
+            interp.exec(source)
+        return f.getvalue(), count[0]
+
+    # the functions below load their arg twice, so they are not inlined
+
+    def test_pure_reused(self):
+        res, count = self.run_counted("""
+        fn sq x is __mul x x
+        fn main is print + sq 3 sq 3
+        """, OP_MUL)
+        self.assertEqual(res, "18.0\n")
+        self.assertEqual(count, 1)
+
+    def test_impure_not_memoized(self):
+        res, count = self.run_counted("""
+        fn show x is __print __add x x
+        fn main is pair show 1 show 1
+        """, OP_ADD)
+        self.assertEqual(res, "2.0\n2.0\n")
+        self.assertEqual(count, 2)
+
+    def test_list_arg_not_memoized(self):
+        res, count = self.run_counted("""
+        fn sq l is __mul head l head l
+        fn main is print + sq pair 3 4 sq pair 3 4
+        """, OP_MUL)
+        self.assertEqual(res, "18.0\n")
+        self.assertEqual(count, 2)
+
+    def test_list_result_not_memoized(self):
+        res, count = self.run_counted("""
+        fn twice x is __pair x x
+        fn main is print fuse twice 1 twice 1
+        """, OP_PAIR)
+        self.assertEqual(res, "[1.0, 1.0, 1.0, 1.0]\n")
+        self.assertEqual(count, 2)
+
+    def test_types_in_key(self):
+        res, count = self.run_counted("""
+        fn twice x is __add __str x __str x
+        fn main is print pair twice 1 twice true
+        """, OP_ADD)
+        self.assertEqual(res, "['1.01.0', 'TrueTrue']\n")
+        self.assertEqual(count, 2)
+
+    def test_signed_zero_in_key(self):
+        res, count = self.run_counted("""
+        fn twice x is __add __str x __str x
+        fn main is print pair twice 0 twice neg 0
+        """, OP_ADD)
+        self.assertEqual(res, "['0.00.0', '-0.0-0.0']\n")
+        self.assertEqual(count, 2)
+
+
 class TestError(unittest.TestCase):
     """Test that errors are raised as they should"""
 
@@ -268,6 +453,28 @@ class TestError(unittest.TestCase):
         with self.assertRaisesRegex(AttoRuntimeError, "Failed .* convert"):
             interp.exec(src)
 
+    def test_broken_func_not_called(self):
+        src = """
+        fn f x is x
+        fn missing_operand is __add 1
+        fn missing_arg is f
+        fn main is print "ok"
+        """
+        interp = Interpreter()
+        f = StringIO()
+        with redirect_stdout(f):
+            interp.exec(src)
+        self.assertEqual(f.getvalue(), "ok\n")
+
+    def test_broken_func_called(self):
+        src = """
+        fn broken is __add 1
+        fn main is print broken
+        """
+        interp = Interpreter()
+        with self.assertRaisesRegex(AttoSyntaxError, "Missing operand for __add"):
+            interp.exec(src)
+
     def test_runtime_treaceback(self):
         src = """
         fn one is print litr "hej"
@@ -286,3 +493,36 @@ class TestError(unittest.TestCase):
         self.assertRegex(tb[0], "__litr .* litr .* core.at")
         self.assertRegex(tb[1], "litr .* one .* :2")
         self.assertRegex(tb[2], "one .* main .* :3")
+
+    def test_tail_call_traceback(self):
+        src = """
+        fn fail x is litr x
+        fn loop n is if = n 0 fail "x" loop - n 1
+        fn main is print loop 3
+        """
+        interp = Interpreter()
+        with self.assertRaises(AttoRuntimeError) as ctx:
+            interp.exec(src)
+        tb = ctx.exception.traceback()
+        # each tail call replaced the frame of the loop before it
+        self.assertEqual(len(tb), 4)
+        self.assertRegex(tb[2], "fail .* loop .* :3")
+        self.assertRegex(tb[3], "loop .* main .* :4")
+
+    def test_tail_call_memory(self):
+        def peak(n):
+            src = f"""
+            fn loop n is if = n 0 print "done" loop - n 1
+            fn main is loop {n}
+            """
+            interp = Interpreter()
+            tracemalloc.start()
+            with redirect_stdout(StringIO()):
+                interp.exec(src)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return peak
+
+        # frames of tail calls are reused, so 10 times as many calls
+        # must not take 10 times as much memory
+        self.assertLess(peak(50000), 2 * peak(5000))
@@ -59,6 +59,11 @@ class TestTextValue(unittest.TestCase):
         self.assertEqual(tok.text(), "1234")
         self.assertEqual(tok.value(), 1234)
 
+    def test_value_shared(self):
+        lex = Lexer('"hello" "hello"', Path())
+        self.assertIs(lex.tokens[0].value(), lex.tokens[0].value())
+        self.assertIs(lex.tokens[0].value(), lex.tokens[1].value())
+
 
 class TestTokenLineCol(unittest.TestCase):
     """Tests that Token reports line and column correctly"""
@@ -88,6 +93,13 @@ class TestTokenLineCol(unittest.TestCase):
         self.assertEqual(line, 2)
         self.assertEqual(col, 1)
 
+    def test_line_col_end_of_line(self):
+        tok = self.create(8)
+        tok.close(9)
+        line, col = tok.line_col()
+        self.assertEqual(line, 1)
+        self.assertEqual(col, 8)
+
 
 class TestLexer(unittest.TestCase):
     """Tests that Lexer can tokenize as expected"""
@@ -139,6 +151,12 @@ class TestLexer(unittest.TestCase):
         self.assertEqual(lex.tokens[0].text(), "1234")
         self.assertEqual(lex.tokens[0].value(), 1234)
 
+    def test_string(self):
+        lex = Lexer('"say \\"hi\\"" "open', Path())
+        self.assertEqual([tok.type for tok in lex.tokens], [TokenTypes.STRING] * 2)
+        self.assertEqual(lex.tokens[0].text(), '"say \\"hi\\""')
+        self.assertEqual(lex.tokens[1].text(), '"open')
+
 
 class TestAttoSyntaxError(unittest.TestCase):
     """Tests that AttoSyntaxError works"""
@@ -121,6 +121,25 @@ class TestParser(unittest.TestCase):
         self.assertEqual(paths.right.token.text(), "__print")
         self.assertEqual(paths.left.left.token.text(), "x")
         self.assertEqual(paths.right.left.token.text(), "y")
+        self.assertEqual(paths.left.left.arg_slot, 0)
+        self.assertEqual(paths.right.left.arg_slot, 1)
+
+    def test_call_target(self):
+        parser = Parser(self.src + "fn main is test 1 2", Path())
+        call = parser.funcs["main"].body
+        self.assertIs(call.call_target, parser.funcs["test"])
+        self.assertEqual([n.token.text() for n in call.arg_nodes], ["1", "2"])
+
+    def test_pure(self):
+        src = """
+        fn add x y is __add x y
+        fn show x is __print add x 1
+        fn twice x is show show x
+        """
+        parser = Parser(src, Path())
+        self.assertTrue(parser.funcs["add"].pure)
+        self.assertFalse(parser.funcs["show"].pure)
+        self.assertFalse(parser.funcs["twice"].pure)
 
 
 class TestParserSyntaxError(unittest.TestCase):
@@ -133,6 +152,13 @@ class TestParserSyntaxError(unittest.TestCase):
         ):
             Parser(src, Path("fake/faker.at"))
 
+    def test_bad_input_identifier(self):
+        src = "fn main is __input x"
+        with self.assertRaisesRegex(
+            AttoSyntaxError, "Could not find identifier x at faker.at:1 col: 19"
+        ):
+            Parser(src, Path("fake/faker.at"))
+
     def test_bad_unknown_identifier(self):
         src = "fn main is __print x"
         with self.assertRaisesRegex(
@@ -0,0 +1,33 @@
+import unittest
+from pathlib import Path
+
+from src.parser import Parser
+from src.specializer import Specializer
+
+
+def generate(src):
+    parser = Parser(src, Path())
+    return Specializer().generate(parser.funcs["main"])
+
+
+class TestSpecializer(unittest.TestCase):
+    """Tests that Specializer generates the expected python source"""
+
+    def test_if(self):
+        source = generate("fn main x is if __eq x 1 2 3")
+        self.assertIn("return (2.0 if (a0 == 1.0) else 3.0)", source)
+
+    def test_if_known_condition(self):
+        source = generate("fn main is if true 2 3")
+        self.assertIn("return 2.0\n", source)
+        source = generate('fn main is if "" 2 3')
+        self.assertIn("return 3.0\n", source)
+
+    def test_call(self):
+        source = generate("fn add x y is __add x y fn main is add 1 2")
+        self.assertIn("def _f1(a0, a1):", source)
+        self.assertIn("return _f1(1.0, 2.0)", source)
+
+
+if __name__ == "__main__":
+    unittest.main()